@@ -5,6 +5,7 @@ import pytest
 from testutils import star_test_generator
 from testutils.star_exdiag import StarExDiagPropagator
 from tmps.star.factory import from_hamiltonian
+from tmps.star.itime.factory import from_hamiltonian as itime_from_hamiltonian
 import tmps.utils.pauli as pauli
 import tmps.utils.fock as fock
 import numpy as np
@@ -115,4 +116,175 @@ def test_irregular_chain(L, system_index, sot, nof_steps, tau):
     if sot:
         assert np.max(max_normdist) < 1e-6
     else:
-        assert np.max(max_normdist) < 1e-8
\ No newline at end of file
+        assert np.max(max_normdist) < 1e-8
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize("L, system_index", [(4, 0), (5, 2)])
+def test_states_not_modified(L, system_index):
+    """
+        Pytest test that the time evolution of a pmps neither modifies the initial state nor the states returned
+        by previous propagation steps
+    :param L: Chain L
+    :param system_index: Index of the system site in the chain
+    :return:
+    """
+    exdiag_state, dims, ed_site_ops, ed_bond_ops, tm_state, tm_site_ops, tm_bond_ops = \
+        star_test_generator.generate_regular_pmps_test(L, system_index, pauli.Z, pauli.Z, pauli.X, pauli.X, seed=42,
+                                                       rank=2)
+    state_compression = {'method': 'svd', 'relerr': 1e-10, 'sites_relerr': 1e-12}
+    tm_prop = from_hamiltonian(tm_state, 'pmps', system_index, tm_site_ops, tm_bond_ops, tau=0.01,
+                               state_compression_kwargs=state_compression)
+    psi_0 = tm_state.copy()
+    last_psi_t, last_psi_t_copy = None, None
+    for psi_t in tm_prop(nof_steps=3):
+        assert mp.normdist(tm_state, psi_0) < 1e-12
+        if last_psi_t is not None:
+            assert psi_t is not last_psi_t
+            assert mp.normdist(last_psi_t, last_psi_t_copy) < 1e-12
+        last_psi_t, last_psi_t_copy = psi_t, psi_t.copy()
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize("L, system_index", [(5, 2), (7, 0)])
+@pytest.mark.parametrize("canonicalize_every_step", [True, False])
+def test_skipped_final_compression(L, system_index, canonicalize_every_step):
+    """
+        Pytest test that skipping a final compression, which cannot truncate the state, does not change the
+        propagation. A pure rank compression (relerr=0) skips the final compression whenever the ranks of the
+        state are already within the rank. The same compression with a tiny but non-zero relerr truncates
+        identically, but never skips the final compression. The rank is chosen such that the local compressions
+        truncate the state.
+    :param L: Chain L
+    :param system_index: Index of the system site in the chain
+    :param canonicalize_every_step: If the state is canonicalized in every compression
+    :return:
+    """
+    nof_steps = 20
+    props = []
+    for relerr in [0, 1e-300]:
+        exdiag_state, dims, ed_site_ops, ed_bond_ops, tm_state, tm_site_ops, tm_bond_ops = \
+            star_test_generator.generate_regular_pmps_test(L, system_index, pauli.Z, pauli.Z, pauli.X, pauli.X,
+                                                           seed=102, rank=2)
+        state_compression = {'method': 'svd', 'rank': 4, 'relerr': relerr,
+                             'canonicalize_every_step': canonicalize_every_step}
+        props.append(from_hamiltonian(tm_state, 'pmps', system_index, tm_site_ops, tm_bond_ops, tau=0.01,
+                                      op_compression_kwargs={'method': 'svd', 'relerr': 1e-12},
+                                      state_compression_kwargs=state_compression, second_order_trotter=True))
+    skipped_prop, ref_prop = props
+    for i in range(nof_steps):
+        skipped_prop.evolve()
+        ref_prop.evolve()
+        assert mp.normdist(skipped_prop.psi_t, ref_prop.psi_t) < 1e-10
+        assert abs(skipped_prop.last_overlap - ref_prop.last_overlap) < 1e-10
+    assert max(skipped_prop.psi_t.ranks) <= 4
+    assert skipped_prop.cumulative_overlap < 0.999
+    assert abs(skipped_prop.cumulative_overlap - ref_prop.cumulative_overlap) < 1e-10
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize("imaginary_time", [False, True])
+def test_info_into(imaginary_time):
+    """
+        Pytest test that info_into returns the same entries as info for real and imaginary time evolution of a pmps,
+        updates a passed dict and reuses its internal dict otherwise
+    :param imaginary_time: Test imaginary instead of real time evolution
+    :return:
+    """
+    L, system_index = 4, 1
+    exdiag_state, dims, ed_site_ops, ed_bond_ops, tm_state, tm_site_ops, tm_bond_ops = \
+        star_test_generator.generate_regular_pmps_test(L, system_index, pauli.Z, pauli.Z, pauli.X, pauli.X, seed=42,
+                                                       rank=2)
+    state_compression = {'method': 'svd', 'relerr': 1e-10, 'sites_relerr': 1e-12}
+    if imaginary_time:
+        tm_prop = itime_from_hamiltonian(tm_state, 'pmps', system_index, tm_site_ops, tm_bond_ops, tau=0.01,
+                                         state_compression_kwargs=state_compression, track_trace=True)
+    else:
+        tm_prop = from_hamiltonian(tm_state, 'pmps', system_index, tm_site_ops, tm_bond_ops, tau=0.01,
+                                   state_compression_kwargs=state_compression)
+    tm_prop.evolve()
+    buf = dict()
+    assert tm_prop.info_into(buf) is buf
+    assert buf == tm_prop.info()
+    internal_buf = tm_prop.info_into()
+    assert internal_buf == tm_prop.info()
+    tm_prop.evolve()
+    assert tm_prop.info_into() is internal_buf
+    assert internal_buf == tm_prop.info()
+
+
+@pytest.mark.fast
+def test_cumulative_overlap():
+    """
+        Pytest test for the tracking of the cumulative overlap of a pmps time evolution with truncating compression:
+        Accumulation over many timesteps, zero overlaps (as used for imaginary time evolution) and resetting by
+        assignment
+    :return:
+    """
+    L, system_index = 4, 1
+    exdiag_state, dims, ed_site_ops, ed_bond_ops, tm_state, tm_site_ops, tm_bond_ops = \
+        star_test_generator.generate_regular_pmps_test(L, system_index, pauli.Z, pauli.Z, pauli.X, pauli.X, seed=42,
+                                                       rank=2)
+    tm_prop = from_hamiltonian(tm_state, 'pmps', system_index, tm_site_ops, tm_bond_ops, tau=0.01,
+                               state_compression_kwargs={'method': 'svd', 'relerr': 1e-4})
+    assert tm_prop.cumulative_overlap == 1
+    overlaps = []
+    for i in range(200):
+        tm_prop.evolve()
+        overlaps.append(tm_prop.last_overlap)
+    assert np.prod(overlaps) < 1 - 1e-6
+    assert abs(tm_prop.cumulative_overlap / np.prod(overlaps) - 1) < 1e-12
+
+    tm_prop.cumulative_overlap = 1
+    assert tm_prop.cumulative_overlap == 1
+    tm_prop.evolve()
+    assert abs(tm_prop.cumulative_overlap - tm_prop.last_overlap) < 1e-15
+
+    tm_prop.cumulative_overlap = 0
+    assert tm_prop.cumulative_overlap == 0
+    tm_prop.evolve()
+    assert tm_prop.cumulative_overlap == 0
+
+    with pytest.raises(AssertionError):
+        tm_prop.cumulative_overlap = -1
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize("L, system_index", [(6, 1), (7, 0)])
+@pytest.mark.parametrize("canonicalize_every_step", [True, False])
+def test_regular_chain_truncated(L, system_index, canonicalize_every_step):
+    """
+        Pytest test for time evolution of a mixed quantum state in pmps form with a rank-limited state compression,
+        which truncates the state in every step. Checks that the truncation error with respect to the exact
+        time evolution stays small
+    :param L: Chain L
+    :param system_index: Index of the system site in the chain
+    :param canonicalize_every_step: If the state is canonicalized in every compression
+    :return:
+    """
+    site_dim = 2
+    nof_steps = 30
+    tau = 0.01
+    exdiag_state, dims, ed_site_ops, ed_bond_ops, tm_state, tm_site_ops, tm_bond_ops = \
+        star_test_generator.generate_regular_pmps_test(L, system_index, pauli.Z, pauli.Z, pauli.X, pauli.X, seed=102,
+                                                       rank=2)
+    op_compression = {'method': 'svd', 'relerr': 1e-12}
+    state_compression = {'method': 'svd', 'relerr': 1e-10, 'sites_relerr': 1e-12, 'rank': 8,
+                         'canonicalize_every_step': canonicalize_every_step}
+
+    tm_prop = from_hamiltonian(tm_state, 'pmps', system_index, tm_site_ops, tm_bond_ops, tau=tau,
+                               op_compression_kwargs=op_compression,
+                               state_compression_kwargs=state_compression,
+                               second_order_trotter=True)
+
+    ed_prop = StarExDiagPropagator(exdiag_state, dims, system_index, ed_site_ops, ed_bond_ops, tau, state_type='op')
+    normdist = []
+    for i in range(nof_steps):
+        tm_prop.evolve()
+        ed_prop.evolve()
+        tmps_psi_t_array = mp.MPArray.to_array_global(mp.pmps_to_mpo(tm_prop.psi_t)).reshape(site_dim ** L,
+                                                                                             site_dim ** L)
+        diff = tmps_psi_t_array - ed_prop.psi_t
+        normdist.append(np.linalg.norm(diff))
+    assert tm_prop.cumulative_overlap < 1 - 1e-6
+    assert np.max(np.array(normdist)) < 1e-2
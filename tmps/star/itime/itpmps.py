@@ -2,7 +2,6 @@
     Imaginary time evolution class. Essentially the same as StarTPMPS class except for the lack of overlap tracking.
 """
 import numpy as np
-import mpnum as mp
 from tmps.star.tpmps import StarTPMPS
 
 
@@ -61,7 +60,7 @@ class StarITPMPS(StarTPMPS):
             Tracks the trace of the density matrix during propagation
         :return:
         """
-        curr_trace = mp.norm(self.psi_t)
+        curr_trace = self._state_norm()
         if self.trace_track:
             self.trace_list.append(np.abs(curr_trace)**2)
         self.psi_t /= curr_trace
@@ -78,7 +77,15 @@ class StarITPMPS(StarTPMPS):
                              time evolution and their respective positions in the chain (first element of each tuple))
         :return: info dict
         """
-        info = dict()
+        return self.info_into(dict())
+
+    def info_into(self, buf=None):
+        """
+            Same as info, but writes the entries into an existing dict instead of allocating a new one.
+        :param buf: dict to be updated. If None, an internal dict is reused, which is overwritten by the next call
+        :return: Updated info dict
+        """
+        info = self._info_buf if buf is None else buf
         info['size'] = self.psi_t.size
         info['ranks'] = self.psi_t.ranks
         info['trotter_error'] = self.real_trotter_error
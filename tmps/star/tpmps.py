@@ -3,7 +3,10 @@
     pmps.
 """
 
+import math
+import numpy as np
 import mpnum as mp
+from mpnum.mpstruct import LocalTensors
 from tmps.star.base.tmpbase import StarTMPBase
 from tmps.utils.cform import canonicalize_to
 from tmps.utils.compress import compress_pmps_sites, compress_pmps
@@ -37,6 +40,18 @@ class StarTPMPS(StarTMPBase):
         assert not self.propagator.build_adj
         # Contract over all indices (physical and ancilla)
         self.axes = ((1, 3), (0, 1))
+        # Same contraction for single site operators, applied directly to the local tensors. Operator legs are
+        # (phys_out, phys_in, ancilla_out, ancilla_in) once the trivial virtual legs are dropped, state legs are
+        # (left, phys, ancilla, right). The permutation restores the state leg order after the contraction.
+        self._site_axes = ((1, 3), (1, 2))
+        self._site_perm = (2, 0, 1, 3)
+
+        # Trotter steps are fixed for the lifetime of the propagator, so everything evolve needs to know about
+        # them is precomputed once. These become stale if the propagator object is modified externally.
+        self._L_edges = (0, propagator.L - 2)
+        self._trotter_plan = self._build_trotter_plan()
+        self._step_trotter_error = propagator.step_trotter_error
+        self._target_rank = _lossless_rank(self.state_compression_kwargs)
 
         self.to_cform = propagator.to_cform
         if psi_0_compression_kwargs is None:
@@ -55,6 +70,9 @@ class StarTPMPS(StarTMPBase):
         # Contains accumulated trotter errors for each timestep
         self.trotter_error = 0
 
+        # Reusable dict for info_into
+        self._info_buf = dict()
+
     def evolve(self):
         """
             Perform a Trotterized time evolution step by tau. Compress after each dot product or after each sweep
@@ -62,53 +80,163 @@ class StarTPMPS(StarTMPBase):
         :return:
         """
         overlap = self.base_overlap
-        last_start_at = self.system_index
+        # Canonicalization and compression work in place. Work on a new MPArray (sharing the local tensors and
+        # canonical form) so that psi_0 and previously returned states are left untouched
+        psi_t = mp.MPArray(LocalTensors(self.psi_t.lt, cform=self.psi_t.canonical_form))
+        # Loop invariant attributes as locals
+        axes = self.axes
+        lc = self.lc
+        state_compression_kwargs = self.state_compression_kwargs
+        to_cform = self.to_cform
+        full_compression = self.full_compression
+        sites_step = self.compress_sites_step
+        sites_relerr = self.compress_sites_relerr
+        sites_rank = self.compress_sites_rank
+        sites_stable = self.compress_sites_stable
+        # With canonicalization at every step, each local compression canonicalizes the bonds it needs by itself,
+        # so a full canonicalization after the site compression would be redundant
+        sites_cform = None if self.canonicalize_every_step else to_cform
+        pmps_compression_step = self.pmps_compression_step
         if not self.canonicalize_every_step:
-            canonicalize_to(self.psi_t, to_cform=self.to_cform)
-        for (start_at, trotter_mpo) in self.propagator.trotter_steps:
-            self.psi_t = mp.partialdot(trotter_mpo, self.psi_t, start_at=start_at, axes=self.axes)
-            if self.full_compression:
-                if (start_at == self.propagator.L - 2 or start_at == 0) and start_at != last_start_at:
-                    # Compress after a full sweep
-                    overlap *= self.psi_t.compress(**self.state_compression_kwargs)
+            canonicalize_to(psi_t, to_cform=to_cform)
+        for (start_at, trotter_mpo, sweep_end, multi_site) in self._trotter_plan:
+            if multi_site:
+                psi_t = mp.partialdot(trotter_mpo, psi_t, start_at=start_at, axes=axes)
+                if not full_compression:
+                    lc.compress(psi_t, start_at)
             else:
-                if len(trotter_mpo) > 1:
-                    self.lc.compress(self.psi_t, start_at)
-            if (start_at == self.propagator.L - 2 or start_at == 0) and start_at != last_start_at:
-                self.pmps_compression_step += 1
-                if self.pmps_compression_step-1 == self.compress_sites_step:
-                    compress_pmps_sites(self.psi_t, relerr=self.compress_sites_relerr, rank=self.compress_sites_rank,
-                                        stable=self.compress_sites_stable, to_cform=self.to_cform)
-                    self.pmps_compression_step = 1
-            last_start_at = start_at
+                psi_t = self._apply_site_op(psi_t, trotter_mpo, start_at)
+            if sweep_end:
+                if full_compression:
+                    overlap *= psi_t.compress(**state_compression_kwargs)
+                pmps_compression_step += 1
+                if pmps_compression_step-1 == sites_step:
+                    compress_pmps_sites(psi_t, relerr=sites_relerr, rank=sites_rank, stable=sites_stable,
+                                        to_cform=sites_cform)
+                    pmps_compression_step = 1
         if self.final_compression:
-            overlap *= self.psi_t.compress(**self.state_compression_kwargs)
+            if self._target_rank is not None and max(psi_t.ranks) <= self._target_rank:
+                # Compression would not truncate anything, its overlap is just the squared norm of the state.
+                # mp.norm canonicalizes towards the same end the compression would sweep to, so the state is left
+                # in the same canonical form
+                overlap *= mp.norm(psi_t)**2
+            else:
+                overlap *= psi_t.compress(**state_compression_kwargs)
         else:
             if not self.canonicalize_every_step:
-                canonicalize_to(self.psi_t, to_cform=self.to_cform)
+                canonicalize_to(psi_t, to_cform=to_cform)
+        self.psi_t = psi_t
+        self.pmps_compression_step = pmps_compression_step
         self._normalize_state()
-        self.cumulative_overlap *= overlap
+        self._accumulate_overlap(overlap)
         self.last_overlap = overlap
         if self.system_index == 0:
             # reset by one, because next propagation step starts at the edge of chain and increments counter immediately
             self.pmps_compression_step -= 1
-        self.trotter_error += self.propagator.step_trotter_error
+        self.trotter_error += self._step_trotter_error
         self.stepno += 1
 
+    def _build_trotter_plan(self):
+        """
+            Builds a tuple with one entry per trotter step of the propagator. Each entry is a tuple of the
+            form (start_at, trotter_mpo, sweep_end, multi_site), where sweep_end is True if the step completes a full
+            sweep through the chain (i.e. starts at one of its edges and not at the same site as the step before) and
+            multi_site is True if the operator acts on more than one site
+        :return: Tuple of trotter step tuples as described above
+        """
+        plan = []
+        last_start_at = self.system_index
+        for (start_at, trotter_mpo) in self.propagator.trotter_steps:
+            sweep_end = start_at in self._L_edges and start_at != last_start_at
+            plan.append((start_at, trotter_mpo, sweep_end, len(trotter_mpo) > 1))
+            last_start_at = start_at
+        return tuple(plan)
+
+    @property
+    def cumulative_overlap(self):
+        """
+            Returns the cumulative product of overlaps for all compressions
+        """
+        return math.exp(self._log_cum_overlap)
+
+    @cumulative_overlap.setter
+    def cumulative_overlap(self, overlap):
+        """
+            Sets the cumulative overlap. Internally it is stored as its logarithm
+        """
+        assert overlap >= 0
+        self._log_cum_overlap = math.log(overlap) if overlap > 0 else -math.inf
+        self._log_cum_c = 0.0
+
+    def _accumulate_overlap(self, overlap):
+        """
+            Multiplies the cumulative overlap by overlap. The product is tracked as a (Kahan-)compensated sum of
+            logarithms, which neither underflows nor accumulates rounding errors over many timesteps
+        :param overlap: Overlap due to compression in the last timestep
+        :return:
+        """
+        if overlap <= 0 or self._log_cum_overlap == -math.inf:
+            self.cumulative_overlap = 0
+            return
+        y = math.log(overlap) - self._log_cum_c
+        t = self._log_cum_overlap + y
+        self._log_cum_c = (t - self._log_cum_overlap) - y
+        self._log_cum_overlap = t
+
+    def _apply_site_op(self, psi, site_mpo, site):
+        """
+            Applies a single site trotter operator to psi. Equivalent to the corresponding partialdot, but
+            contracts the local tensor directly instead of going through mpnum's generic dot product.
+            Like partialdot, the returned state carries no canonical form information. Local compressions choose
+            their direction and canonicalize based on that information, so keeping it would change the gauge in
+            which (lossy) truncations happen.
+        :param psi: State as MPArray
+        :param site_mpo: Trotter operator as MPArray of length 1
+        :param site: Index of the site in the chain on which the operator acts
+        :return: New state as MPArray
+        """
+        op = site_mpo.lt[0][0, ..., 0]
+        ltens = list(psi.lt)
+        ltens[site] = np.tensordot(op, ltens[site], axes=self._site_axes).transpose(self._site_perm)
+        return mp.MPArray(ltens)
+
     def _normalize_state(self):
         """
             Normalizes psi_t by dividing by its l2 norm. Internal normalization. Can be overloaded for
             tracking purposes. Is only called during the propagation
         :return:
         """
-        self.psi_t /= mp.norm(self.psi_t)
+        norm = self._state_norm()
+        if norm != 1.0:
+            self.psi_t *= 1.0 / norm
+
+    def _state_norm(self):
+        """
+            Returns the l2 norm of psi_t. If all but one site of psi_t are normalized (as is the case after a
+            compression), the norm is read off from the remaining site instead of canonicalizing the whole chain.
+        :return: l2 norm of psi_t
+        """
+        lcanon, rcanon = self.psi_t.canonical_form
+        if rcanon - lcanon == 1:
+            return np.linalg.norm(self.psi_t.lt[lcanon])
+        return mp.norm(self.psi_t)
 
     def normalize_state(self):
         """
             Normalizes psi_t by dividing by its l2 norm.
         :return:
         """
-        self.psi_t /= mp.norm(self.psi_t)
+        norm = mp.norm(self.psi_t)
+        if norm != 1.0:
+            self.psi_t *= 1.0 / norm
+
+    def update_compression(self, state_compression_kwargs):
+        """
+            Interface to change compression on the fly
+        :param state_compression_kwargs: Optional compression kwargs for the time evolution
+        """
+        super().update_compression(state_compression_kwargs)
+        self._target_rank = _lossless_rank(self.state_compression_kwargs)
 
     def info(self):
         """
@@ -123,7 +251,16 @@ class StarTPMPS(StarTMPBase):
                              time evolution and their respective positions in the chain (first element of each tuple))
         :return: info dict
         """
-        info = dict()
+        return self.info_into(dict())
+
+    def info_into(self, buf=None):
+        """
+            Same as info, but writes the entries into an existing dict instead of allocating a new one.
+            Designed to be called after every propagation step.
+        :param buf: dict to be updated. If None, an internal dict is reused, which is overwritten by the next call
+        :return: Updated info dict
+        """
+        info = self._info_buf if buf is None else buf
         info['ranks'] = self.psi_t.ranks
         info['size'] = self.psi_t.size
         info['overlap'] = self.cumulative_overlap
@@ -163,3 +300,13 @@ class StarTPMPS(StarTMPBase):
             self.trotter_error = 0
             self.stepno = 0
         super().reset(psi_0=psi_0, state_compression_kwargs=state_compression_kwargs)
+
+
+def _lossless_rank(state_compression_kwargs):
+    """
+        Returns the rank up to which a compression with the passed kwargs cannot truncate anything. None if
+        the compression may truncate at any rank (e.g. for compression with a relative error)
+    """
+    if state_compression_kwargs.get('method', 'svd') != 'svd' or state_compression_kwargs.get('relerr'):
+        return None
+    return state_compression_kwargs.get('rank')
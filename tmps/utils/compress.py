@@ -70,23 +70,30 @@ def compress_pmps_sites(pmps, relerr=1e-10, rank=None, stable=False, to_cform=No
     """
     for site, lt in enumerate(pmps._lt):
         new_lt = _compressed_lt(lt, relerr, rank, stable)
-        pmps._lt.update(site, new_lt, canonicalization=None)
+        # Sites which cannot be truncated are left untouched (and keep their canonicalization)
+        if new_lt is not lt:
+            pmps._lt.update(site, new_lt, canonicalization=None)
     canonicalize_to(pmps, to_cform=to_cform)
 
 
 def _compressed_lt(lt, relerr, rank, stable):
     """
-        Compresses the local tensor lt in the case of a pmps
+        Compresses the local tensor lt in the case of a pmps. Returns lt itself if no singular values are truncated
+        (and lt was not overwritten by the svd)
     """
     # Get sizes of virtual (i, j) and physical (m, n) legs
     i, m, n, j = lt.shape
+    # The gesvd variants may overwrite lt, in which case it must be rebuilt from the svd in any case
+    overwritten = True
     if not stable:
         try:
             u, sv, v = svd(lt.reshape(i*m, n*j), lapack_driver='gesdd', full_matrices=False)
+            overwritten = False
         except np.linalg.LinAlgError:
             u, sv, v = svd(lt.reshape(i*m, n*j), lapack_driver='gesvd', overwrite_a=True, full_matrices=False)
     else:
         u, sv, v = svd(lt.reshape(i*m, n*j), lapack_driver='gesvd', overwrite_a=True, full_matrices=False)
+    full_rank = len(sv)
     if relerr is None:
         k_prime = min(rank, len(sv))
         u = u[:, :k_prime]
@@ -97,4 +104,6 @@ def _compressed_lt(lt, relerr, rank, stable):
         svsum = np.cumsum(sv) / np.sum(sv)
         rank_relerr = np.searchsorted(svsum, 1 - relerr) + 1
         rank_t = min(len(sv), rank, rank_relerr) if rank is not None else min(len(sv), rank_relerr)
+    if rank_t == full_rank and not overwritten:
+        return lt
     return np.dot(u[:, :rank_t], sv[:rank_t, None] * v[:rank_t, :]).reshape((i, m, n, j))